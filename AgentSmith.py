@@ -1,9 +1,43 @@
+import bisect
+import functools
 import json
 import random
 import os
 import re
 import sys
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Bound once so the hot path skips the module attribute lookup; still backed by
+# the shared generator, so random.seed() keeps making output reproducible
+_choices = random.choices
+_random = random.random
+_bisect = bisect.bisect
+
+# User agent templates per browser, formatted with (os_string, browser_version, browser_name)
+USER_AGENT_TEMPLATES = {
+    "Chrome": "Mozilla/5.0 ({0}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{1} Safari/537.36",
+    "Firefox": "Mozilla/5.0 ({0}; rv:{1}) Gecko/20100101 Firefox/{1}",
+    "Safari": "Mozilla/5.0 ({0}) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{1} Safari/605.1.15",
+    "Edge": "Mozilla/5.0 ({0}) AppleWebKit/537.36 (KHTML, like Gecko) Edg/{1}",
+}
+
+DEFAULT_USER_AGENT_TEMPLATE = "Mozilla/5.0 ({0}) AppleWebKit/537.36 (KHTML, like Gecko) {2}/{1}"
+
+# Substrings a valid user agent must contain at least one of
+BROWSER_PATTERNS = ("Chrome", "Firefox", "Safari", "Edg")
+OS_PATTERNS = ("Windows", "Mac OS X", "Linux", "X11")
+
+# Fields every browser entry in the JSON data must define
+REQUIRED_BROWSER_FIELDS = ("name", "versions", "os")
+
+_BROWSER_RE = re.compile("|".join(map(re.escape, BROWSER_PATTERNS)))
+_OS_RE = re.compile("|".join(map(re.escape, OS_PATTERNS)))
+
 class UserAgentError(Exception):
     """Base exception class for user agent generation errors"""
     pass
@@ -12,7 +46,7 @@ class InvalidJSONFormatError(UserAgentError):
     """Exception raised when JSON format is invalid"""
     pass
 
-class FileNotFoundError(UserAgentError):
+class UAFileNotFoundError(UserAgentError):
     """Exception raised when file is not found"""
     pass
 
@@ -32,7 +66,7 @@ def validate_json_structure(data):
     if "browsers" not in data:
         raise InvalidJSONFormatError("JSON data must contain a 'browsers' key")
     
-    if not isinstance(data["browsers"], list) or len(data["browsers"]) == 0:
+    if not isinstance(data["browsers"], list) or not data["browsers"]:
         raise InvalidJSONFormatError("'browsers' must be a non-empty list")
     
     for i, browser in enumerate(data["browsers"]):
@@ -40,17 +74,16 @@ def validate_json_structure(data):
             raise InvalidJSONFormatError(f"Browser at index {i} must be a dictionary")
         
         # Check required fields
-        required_fields = ["name", "versions", "os"]
-        for field in required_fields:
+        for field in REQUIRED_BROWSER_FIELDS:
             if field not in browser:
                 raise InvalidJSONFormatError(f"Browser at index {i} is missing '{field}' field")
         
         # Validate versions
-        if not isinstance(browser["versions"], list) or len(browser["versions"]) == 0:
+        if not isinstance(browser["versions"], list) or not browser["versions"]:
             raise InvalidJSONFormatError(f"Browser '{browser.get('name', f'at index {i}')}' must have non-empty 'versions' list")
         
         # Validate OS entries
-        if not isinstance(browser["os"], list) or len(browser["os"]) == 0:
+        if not isinstance(browser["os"], list) or not browser["os"]:
             raise InvalidJSONFormatError(f"Browser '{browser.get('name', f'at index {i}')}' must have non-empty 'os' list")
         
         for j, os_info in enumerate(browser["os"]):
@@ -60,29 +93,56 @@ def validate_json_structure(data):
             if "name" not in os_info:
                 raise InvalidJSONFormatError(f"OS at index {j} for browser '{browser.get('name', f'at index {i}')}' is missing 'name' field")
             
-            if "versions" not in os_info or not isinstance(os_info["versions"], list) or len(os_info["versions"]) == 0:
+            if "versions" not in os_info or not isinstance(os_info["versions"], list) or not os_info["versions"]:
                 raise InvalidJSONFormatError(f"OS '{os_info.get('name', f'at index {j}')}' for browser '{browser.get('name', f'at index {i}')}' must have non-empty 'versions' list")
 
+@functools.lru_cache(maxsize=16)
+def _load_user_agents(json_file, mtime_ns, size):
+    """Read, validate and flatten a JSON file, cached on its path, mtime and size
+    
+    Returns the raw file contents and the flat table. Both are immutable, so the
+    cached result can be shared safely; callers parse their own copy of the data.
+    """
+    # Open and parse JSON file
+    with open(json_file, 'rb') as file:
+        raw = file.read()
+    
+    try:
+        data = _json_loads(raw)
+    except json.JSONDecodeError as e:
+        raise InvalidJSONFormatError(f"Invalid JSON format: {str(e)}")
+    
+    # Validate JSON structure
+    validate_json_structure(data)
+    
+    # Flatten once so every generation is a single draw
+    return raw, build_flat_table(data)
+
 def load_user_agents(json_file):
-    """Load user agents from JSON file with error handling"""
+    """Load user agents from JSON file with error handling
+    
+    Repeated loads of an unchanged file within the same process skip reading,
+    validating and flattening it. The JSON is still parsed on every call, so each
+    caller gets a fresh dictionary and changes made by one caller are not seen by
+    the next.
+    
+    The returned dictionary carries the flat table used for generation under
+    '_flat'. It is not rebuilt when the dictionary is edited, so call
+    data.pop('_flat', None) after changing it.
+    """
     try:
-        # Check if file exists
-        if not os.path.exists(json_file):
-            raise FileNotFoundError(f"File not found: {json_file}")
-        
-        # Check if file is readable
-        if not os.access(json_file, os.R_OK):
-            raise PermissionError(f"Permission denied: Cannot read {json_file}")
-        
-        # Open and parse JSON file
-        with open(json_file, 'r') as file:
-            try:
-                data = json.load(file)
-            except json.JSONDecodeError as e:
-                raise InvalidJSONFormatError(f"Invalid JSON format: {str(e)}")
+        # Let stat() and open() report missing or unreadable files themselves
+        # instead of checking up front, which costs extra syscalls and races
+        try:
+            st = os.stat(json_file)
+            raw, flat = _load_user_agents(os.path.abspath(json_file), st.st_mtime_ns, st.st_size)
+        except FileNotFoundError as e:
+            raise UAFileNotFoundError(f"File not found: {json_file}") from e
+        except PermissionError as e:
+            raise UserAgentError(f"Permission denied: Cannot read {json_file}") from e
         
-        # Validate JSON structure
-        validate_json_structure(data)
+        data = _json_loads(raw)
+        data["_flat"] = flat
         
         return data
         
@@ -115,6 +175,10 @@ def get_os_string(os_name, os_version):
 
 def validate_user_agent(user_agent):
     """Validate generated user agent format"""
+    # Check for minimum length first, it needs no scan of the string
+    if len(user_agent) < 30:
+        return False
+    
     # Check for basic user agent structure
     if not user_agent.startswith("Mozilla/5.0"):
         return False
@@ -123,82 +187,124 @@ def validate_user_agent(user_agent):
     if user_agent.count('(') != user_agent.count(')'):
         return False
     
-    # Check for minimum length
-    if len(user_agent) < 30:
-        return False
-    
     # Check if it contains basic browser info
-    browser_patterns = ["Chrome", "Firefox", "Safari", "Edg"]
-    if not any(pattern in user_agent for pattern in browser_patterns):
+    if not _BROWSER_RE.search(user_agent):
         return False
     
     # Check for common OS strings
-    os_patterns = ["Windows", "Mac OS X", "Linux", "X11"]
-    if not any(pattern in user_agent for pattern in os_patterns):
+    if not _OS_RE.search(user_agent):
         return False
     
     return True
 
-def generate_user_agent(data):
-    """Generate a single feasible user agent"""
-    try:
+def build_flat_table(data):
+    """Enumerate every feasible (browser, browser version, OS, OS version) combination
+    
+    Returns the (browser name, browser version, OS string) combinations and their
+    cumulative weights as tuples, so that a single weighted draw reproduces picking
+    the browser, browser version, OS and OS version uniformly one after the other.
+    The OS string is formatted here once, so generation never calls get_os_string.
+    OS strings are interned, so each distinct one is stored once however many
+    browsers and browser versions share it.
+    """
+    combos = []
+    cum_weights = []
+    total = 0.0
+    
+    # Skip browsers with no OS data or invalid versions
+    feasible_browsers = [
+        browser for browser in data['browsers']
+        if browser.get('os') and isinstance(browser.get('versions'), list) and browser['versions']
+    ]
+    
+    for browser in feasible_browsers:
+        # Skip OS entries with no versions or invalid data
+        feasible_os = [
+            os_info for os_info in browser['os']
+            if os_info.get('versions') and isinstance(os_info['versions'], list) and os_info['versions']
+        ]
+        if not feasible_os:
+            continue
+        
+        # The name is used as a template key and in the user agent text
+        if not isinstance(browser['name'], str):
+            raise InvalidJSONFormatError(f"Browser name must be a string, got: {browser['name']!r}")
+        
+        for browser_version in browser['versions']:
+            for os_info in feasible_os:
+                weight = 1.0 / (len(feasible_browsers) * len(browser['versions']) * len(feasible_os) * len(os_info['versions']))
+                for os_version in os_info['versions']:
+                    total += weight
+                    os_string = sys.intern(get_os_string(os_info['name'], os_version))
+                    combos.append((browser['name'], browser_version, os_string))
+                    cum_weights.append(total)
+    
+    return tuple(combos), tuple(cum_weights)
+
+def _get_flat_table(data):
+    """Return the cached flat table for data, building it on first use
+    
+    The table is built once per data dictionary and never rebuilt automatically.
+    Any later change to data must be followed by data.pop('_flat', None).
+    """
+    flat = data.get("_flat") if isinstance(data, dict) else None
+    
+    # Data from load_user_agents is already validated and flattened; only
+    # hand-built data needs checking, and only on its first use
+    if flat is None:
         if not data or not isinstance(data, dict) or "browsers" not in data:
             raise EmptyDataError("Invalid or empty data structure")
         
         if not data["browsers"]:
             raise EmptyDataError("No browser data available")
         
-        # Filter out browsers with no OS data or invalid versions
-        feasible_browsers = [
-            browser for browser in data['browsers']
-            if browser.get('os') and isinstance(browser.get('versions'), list) and browser['versions']
-        ]
+        try:
+            flat = build_flat_table(data)
+        except Exception as e:
+            if isinstance(e, UserAgentError):
+                raise
+            else:
+                raise UserAgentError(f"Error building user agent table: {str(e)}")
         
-        if not feasible_browsers:
+        if not flat[0]:
             raise EmptyDataError("No feasible browser data available")
-        
-        # Select a random browser from the feasible list
-        browser = random.choice(feasible_browsers)
-        browser_name = browser['name']
-        browser_version = random.choice(browser['versions'])
-        
-        # Filter out OS entries with no versions or invalid data
-        feasible_os = [
-            os_info for os_info in browser['os']
-            if os_info.get('versions') and isinstance(os_info['versions'], list) and os_info['versions']
-        ]
-        
-        if not feasible_os:
-            raise EmptyDataError(f"No feasible OS data available for browser: {browser_name}")
-        
-        # Select a random OS from the feasible list
-        os_info = random.choice(feasible_os)
-        os_name = os_info['name']
-        os_version = random.choice(os_info['versions'])
-        
-        # Generate the user agent string based on the browser
-        if browser_name == "Chrome":
-            user_agent = f"Mozilla/5.0 ({get_os_string(os_name, os_version)}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{browser_version} Safari/537.36"
-        elif browser_name == "Firefox":
-            user_agent = f"Mozilla/5.0 ({get_os_string(os_name, os_version)}; rv:{browser_version}) Gecko/20100101 Firefox/{browser_version}"
-        elif browser_name == "Safari":
-            user_agent = f"Mozilla/5.0 ({get_os_string(os_name, os_version)}) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{browser_version} Safari/605.1.15"
-        elif browser_name == "Edge":
-            user_agent = f"Mozilla/5.0 ({get_os_string(os_name, os_version)}) AppleWebKit/537.36 (KHTML, like Gecko) Edg/{browser_version}"
-        else:
-            user_agent = f"Mozilla/5.0 ({get_os_string(os_name, os_version)}) AppleWebKit/537.36 (KHTML, like Gecko) {browser_name}/{browser_version}"
-        
-        # Validate the generated user agent
-        if not validate_user_agent(user_agent):
-            raise InvalidUserAgentError(f"Generated invalid user agent: {user_agent}")
-        
-        return user_agent
+        data["_flat"] = flat
     
-    except Exception as e:
-        if isinstance(e, UserAgentError):
-            raise
-        else:
-            raise UserAgentError(f"Error generating user agent: {str(e)}")
+    return flat
+
+def _format_user_agent(browser_name, browser_version, os_string):
+    """Build and validate the user agent string for a single combination"""
+    # Generate the user agent string based on the browser
+    template = USER_AGENT_TEMPLATES.get(browser_name, DEFAULT_USER_AGENT_TEMPLATE)
+    user_agent = template.format(os_string, browser_version, browser_name)
+    
+    # Validate the generated user agent; skipped under python -O, where the
+    # known templates are trusted to produce well-formed strings
+    if __debug__ and not validate_user_agent(user_agent):
+        raise InvalidUserAgentError(f"Generated invalid user agent: {user_agent}")
+    
+    return user_agent
+
+def generate_user_agent(data):
+    """Generate a single feasible user agent"""
+    combos, cum_weights = _get_flat_table(data)
+    
+    # Select browser, browser version and OS in a single draw; this is what
+    # random.choices does for k=1, without building a one-element list
+    return _format_user_agent(*combos[_bisect(cum_weights, _random() * cum_weights[-1], 0, len(cum_weights) - 1)])
+
+def generate_user_agents_batch(data, n):
+    """Generate a list of n feasible user agents
+    
+    All n combinations are drawn in a single call, so the per-agent overhead of
+    generate_user_agent is paid only once for the whole batch.
+    """
+    if not isinstance(n, int) or isinstance(n, bool) or n < 0:
+        raise UserAgentError(f"Batch size must be a non-negative integer, got: {n!r}")
+    
+    combos, cum_weights = _get_flat_table(data)
+    
+    return [_format_user_agent(*combo) for combo in _choices(combos, cum_weights=cum_weights, k=n)]
 
 def main():
     """Main function to generate a single user agent"""